@@ -4,18 +4,55 @@
 
 import argparse
 import sqlite3
+import sys
+from collections.abc import Iterable, Iterator
 from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
 
+# WAL-журнал не поддерживается на сетевых файловых системах (NFS, SMB):
+# для базы данных на таком диске замените journal_mode=WAL на TRUNCATE.
+SQLITE_PRAGMAS = """
+PRAGMA journal_mode=WAL;
+PRAGMA synchronous=NORMAL;
+PRAGMA temp_store=MEMORY;
+PRAGMA cache_size=-65536;
+PRAGMA mmap_size=268435456;
+"""
 
-@dataclass(frozen=True)
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS posts (
+    post_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    post_title TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    worker_name TEXT NOT NULL,
+    post_id INTEGER NOT NULL,
+    worker_year INTEGER NOT NULL,
+    FOREIGN KEY(post_id) REFERENCES posts(post_id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_workers_year ON workers (worker_year);
+"""
+
+# Количество строк, забираемых из курсора за одно обращение.
+FETCH_SIZE = 1000
+
+
+def iter_rows(cursor: sqlite3.Cursor) -> Iterator:
+    while rows := cursor.fetchmany():
+        yield from rows
+
+
+@dataclass(frozen=True, slots=True)
 class Post:
     id: int
     title: str
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Worker:
     name: str
     post: str
@@ -23,141 +60,224 @@ class Worker:
 
 
 class StaffRepository:
+    _SQL_UPSERT_POST = """
+        INSERT INTO posts (post_title)
+        VALUES (?)
+        ON CONFLICT (post_title) DO UPDATE SET post_title = excluded.post_title
+        RETURNING post_id
+    """
+
+    _SQL_INSERT_WORKER = """
+        INSERT INTO workers (worker_name, post_id, worker_year)
+        VALUES (?, ?, ?)
+    """
+
+    _SQL_SELECT_POSTS = """
+        SELECT post_id, post_title
+        FROM posts
+    """
+
+    _SQL_SELECT_WORKERS = """
+        SELECT worker_name, post_id, worker_year
+        FROM workers
+    """
+
+    _SQL_SELECT_WORKERS_BY_PERIOD = """
+        SELECT worker_name, post_id, worker_year
+        FROM workers
+        WHERE worker_year <= ?
+    """
+
     def __init__(self, db_path: Path) -> None:
         self.db_path = db_path
+        self._post_cache: dict[str, int] = {}
+        self._post_titles: dict[int, str] = {}
+        # Кэш списка работников живёт в пределах процесса и сбрасывается
+        # при добавлении работников через этот репозиторий. Изменения,
+        # сделанные другими процессами, в нём не видны.
+        self._workers_cache: tuple[Worker, ...] | None = None
+        self._conn = self._connect()
         self._create_db()
 
+    def __enter__(self) -> "StaffRepository":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
     def _connect(self) -> sqlite3.Connection:
-        return sqlite3.connect(self.db_path)
+        conn = sqlite3.connect(self.db_path, cached_statements=256)
+        conn.executescript(SQLITE_PRAGMAS)
+        return conn
+
+    def close(self) -> None:
+        self._conn.close()
 
     def _create_db(self) -> None:
-        conn = self._connect()
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS posts (
-                post_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                post_title TEXT NOT NULL UNIQUE
-            )
-            """
-        )
+        self._conn.executescript(SCHEMA)
 
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS workers (
-                worker_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                worker_name TEXT NOT NULL,
-                post_id INTEGER NOT NULL,
-                worker_year INTEGER NOT NULL,
-                FOREIGN KEY(post_id) REFERENCES posts(post_id)
-            )
-            """
+    def _load_posts(self) -> None:
+        rows = self._conn.execute(self._SQL_SELECT_POSTS).fetchall()
+        self._post_titles = dict(rows)
+        self._post_cache = {title: post_id for post_id, title in rows}
+
+    def _remember_posts(self, post_ids: dict[str, int]) -> None:
+        self._post_cache.update(post_ids)
+        self._post_titles.update(
+            (post_id, title) for title, post_id in post_ids.items()
         )
 
-        conn.commit()
-        conn.close()
+    def _worker_row_factory(self, cursor: sqlite3.Cursor, row: tuple) -> Worker | None:
+        name, post_id, year = row
 
-    def get_or_create_post(self, title: str) -> int | None:
-        conn = self._connect()
-        cursor = conn.cursor()
+        if post_id not in self._post_titles:
+            # Должность могла быть добавлена другим процессом.
+            self._load_posts()
 
-        cursor.execute("SELECT post_id FROM posts WHERE post_title = ?", (title,))
-        row = cursor.fetchone()
+        title = self._post_titles.get(post_id)
+        if title is None:
+            # SQLite не проверяет внешний ключ: работник без существующей
+            # должности пропускается, как раньше при INNER JOIN.
+            return None
 
-        if row is None:
-            cursor.execute("INSERT INTO posts (post_title) VALUES (?)", (title,))
-            post_id = cursor.lastrowid
-            conn.commit()
-        else:
-            post_id = row[0]
+        return Worker(name, title, year)
+
+    def _resolve_post(self, cursor: sqlite3.Cursor, title: str) -> int:
+        post_id = self._post_cache.get(title)
+
+        if post_id is None:
+            cursor.execute(self._SQL_UPSERT_POST, (title,))
+            post_id = cursor.fetchone()[0]
+
+        return post_id
+
+    def get_or_create_post(self, title: str) -> int:
+        with self._conn:
+            post_id = self._resolve_post(self._conn.cursor(), title)
 
-        conn.close()
+        self._remember_posts({title: post_id})
         return post_id
 
     def add_worker(self, name: str, post: str, year: int) -> None:
-        post_id = self.get_or_create_post(post)
+        self.add_workers([(name, post, year)])
 
-        conn = self._connect()
-        cursor = conn.cursor()
+    def add_workers(self, rows: list[tuple[str, str, int]]) -> None:
+        self._workers_cache = None
 
-        cursor.execute(
-            """
-            INSERT INTO workers (worker_name, post_id, worker_year)
-            VALUES (?, ?, ?)
-            """,
-            (name, post_id, year),
-        )
+        with self._conn:
+            cursor = self._conn.cursor()
 
-        conn.commit()
-        conn.close()
-
-    def get_all_workers(self) -> list[Worker]:
-        conn = self._connect()
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """
-            SELECT workers.worker_name,
-                   posts.post_title,
-                   workers.worker_year
-            FROM workers
-            JOIN posts ON posts.post_id = workers.post_id
-            """
-        )
+            post_ids = {
+                title: self._resolve_post(cursor, title)
+                for title in {post for _, post, _ in rows}
+            }
+
+            cursor.executemany(
+                self._SQL_INSERT_WORKER,
+                [(name, post_ids[post], year) for name, post, year in rows],
+            )
 
-        rows = cursor.fetchall()
-        conn.close()
+        # Кэшируем идентификаторы только после фиксации транзакции,
+        # чтобы не запомнить должность, добавление которой было отменено.
+        self._remember_posts(post_ids)
+
+    def get_all_workers(self) -> Iterator[Worker]:
+        if self._workers_cache is None:
+            cursor = self._conn.cursor()
+            cursor.row_factory = self._worker_row_factory
+            cursor.arraysize = FETCH_SIZE
+            cursor.execute(self._SQL_SELECT_WORKERS)
+            self._workers_cache = tuple(
+                worker for worker in iter_rows(cursor) if worker is not None
+            )
 
-        return [Worker(row[0], row[1], row[2]) for row in rows]
+        return iter(self._workers_cache)
 
     def select_by_period(self, period: int) -> list[Worker]:
-        current_year = datetime.now().year
-
-        conn = self._connect()
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """
-            SELECT workers.worker_name,
-                   posts.post_title,
-                   workers.worker_year
-            FROM workers
-            JOIN posts ON posts.post_id = workers.post_id
-            WHERE (? - workers.worker_year) >= ?
-            """,
-            (current_year, period),
-        )
+        max_year = datetime.now().year - period
 
-        rows = cursor.fetchall()
-        conn.close()
+        cursor = self._conn.cursor()
+        cursor.row_factory = self._worker_row_factory
+        cursor.execute(self._SQL_SELECT_WORKERS_BY_PERIOD, (max_year,))
 
-        return [Worker(row[0], row[1], row[2]) for row in rows]
+        return [worker for worker in cursor.fetchall() if worker is not None]
 
 
-def display_workers(workers: list[Worker]) -> None:
-    if not workers:
-        print("Список работников пуст.")
-        return
+WORKERS_LINE = "+-{}-+-{}-+-{}-+-{}-+".format("-" * 4, "-" * 30, "-" * 20, "-" * 8)
+WORKERS_HEADER = "| {:^4} | {:^30} | {:^20} | {:^8} |".format(
+    "№", "Ф.И.О.", "Должность", "Год"
+)
+WORKERS_ROW = "| {:>4} | {:<30} | {:<20} | {:>8} |".format
 
-    line = "+-{}-+-{}-+-{}-+-{}-+".format("-" * 4, "-" * 30, "-" * 20, "-" * 8)
 
-    print(line)
-    print(
-        "| {:^4} | {:^30} | {:^20} | {:^8} |".format("№", "Ф.И.О.", "Должность", "Год")
-    )
-    print(line)
+def display_workers(workers: Iterable[Worker]) -> None:
+    row_format = WORKERS_ROW
+    rows = [row_format(idx, w.name, w.post, w.year) for idx, w in enumerate(workers, 1)]
 
-    for idx, w in enumerate(workers, 1):
-        print("| {:>4} | {:<30} | {:<20} | {:>8} |".format(idx, w.name, w.post, w.year))
+    if not rows:
+        print("Список работников пуст.")
+        return
 
-    print(line)
+    line = WORKERS_LINE
+    sys.stdout.write("\n".join([line, WORKERS_HEADER, line, *rows, line]) + "\n")
+
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DB_PATH = BASE_DIR / "workers.db"
+
+# Подкоманды, разбираемые без построения argparse: флаг -> имя параметра.
+# Все перечисленные параметры обязательны.
+FAST_COMMANDS = {
+    "add": {
+        "-n": "name",
+        "--name": "name",
+        "-p": "post",
+        "--post": "post",
+        "-y": "year",
+        "--year": "year",
+    },
+    "display": {},
+    "select": {"-p": "period", "--period": "period"},
+}
+
+INT_OPTIONS = {"year", "period"}
+
+
+def parse_fast(argv: list[str]) -> argparse.Namespace | None:
+    # Разбирает типовой вызов вида "[--db ПУТЬ] КОМАНДА -флаг значение ...".
+    # При любом отклонении возвращает None, и строку разбирает argparse,
+    # который и сообщит об ошибке или выведет справку.
+    db = str(DB_PATH)
+    if len(argv) >= 2 and argv[0] == "--db":
+        db, argv = argv[1], argv[2:]
+
+    if not argv or argv[0] not in FAST_COMMANDS:
+        return None
+
+    command, options = argv[0], argv[1:]
+    flags = FAST_COMMANDS[command]
+    if len(options) % 2:
+        return None
+
+    values: dict[str, str | int] = {}
+    for flag, value in zip(options[::2], options[1::2]):
+        dest = flags.get(flag)
+        if dest is None or dest in values or value.startswith("-"):
+            return None
+        if dest in INT_OPTIONS:
+            if not (value.isascii() and value.isdigit()):
+                return None
+            values[dest] = int(value)
+        else:
+            values[dest] = value
 
+    if len(values) != len(set(flags.values())):
+        return None
+
+    return argparse.Namespace(db=db, command=command, **values)
 
-def main(command_line=None):
-    BASE_DIR = Path(__file__).resolve().parent.parent
-    DB_PATH = BASE_DIR / "workers.db"
 
+def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser("workers")
 
     parser.add_argument("--db", default=str(DB_PATH), help="Файл базы данных")
@@ -176,22 +296,28 @@ def main(command_line=None):
     select = subparsers.add_parser("select", help="Выборка по стажу")
     select.add_argument("-p", "--period", required=True, type=int)
 
-    args = parser.parse_args(command_line)
+    return parser
 
-    repo = StaffRepository(Path(args.db))
 
-    if args.command == "add":
-        repo.add_worker(args.name, args.post, args.year)
-        print(f"Работник {args.name} успешно добавлен.")
+def main(command_line=None):
+    if command_line is None:
+        command_line = sys.argv[1:]
+
+    args = parse_fast(command_line) or build_parser().parse_args(command_line)
 
-    elif args.command == "display":
-        display_workers(repo.get_all_workers())
+    with StaffRepository(Path(args.db)) as repo:
+        if args.command == "add":
+            repo.add_worker(args.name, args.post, args.year)
+            print(f"Работник {args.name} успешно добавлен.")
 
-    elif args.command == "select":
-        display_workers(repo.select_by_period(args.period))
+        elif args.command == "display":
+            display_workers(repo.get_all_workers())
 
-    else:
-        parser.print_help()
+        elif args.command == "select":
+            display_workers(repo.select_by_period(args.period))
+
+        else:
+            build_parser().print_help()
 
 
 if __name__ == "__main__":
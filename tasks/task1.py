@@ -4,18 +4,59 @@
 
 import argparse
 import sqlite3
+import sys
+from collections.abc import Iterable, Iterator
 from dataclasses import dataclass
 from pathlib import Path
-
-
-@dataclass
+from typing import TextIO
+
+# WAL-журнал не поддерживается на сетевых файловых системах (NFS, SMB):
+# для базы данных на таком диске замените journal_mode=WAL на TRUNCATE.
+SQLITE_PRAGMAS = """
+PRAGMA journal_mode=WAL;
+PRAGMA synchronous=NORMAL;
+PRAGMA temp_store=MEMORY;
+PRAGMA cache_size=-65536;
+PRAGMA mmap_size=268435456;
+"""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS airports (
+    code TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    city TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS flights (
+    number TEXT PRIMARY KEY,
+    departure_airport TEXT NOT NULL,
+    arrival_airport TEXT NOT NULL,
+    departure_time TEXT NOT NULL,
+    arrival_time TEXT NOT NULL,
+    FOREIGN KEY(departure_airport) REFERENCES airports(code),
+    FOREIGN KEY(arrival_airport) REFERENCES airports(code)
+);
+
+CREATE INDEX IF NOT EXISTS ix_flights_arrival ON flights (arrival_airport);
+"""
+
+# Количество строк, забираемых из курсора за одно обращение.
+FETCH_SIZE = 1000
+
+
+def iter_rows(cursor: sqlite3.Cursor) -> Iterator:
+    while rows := cursor.fetchmany():
+        yield from rows
+
+
+@dataclass(frozen=True, slots=True)
 class Airport:
     code: str
     name: str
     city: str
 
 
-@dataclass
+@dataclass(slots=True)
 class Flight:
     number: str
     departure_airport: str
@@ -24,59 +65,100 @@ class Flight:
     arrival_time: str
 
 
+def airport_row_factory(cursor: sqlite3.Cursor, row: tuple) -> Airport:
+    return Airport(*row)
+
+
+def flight_row_factory(cursor: sqlite3.Cursor, row: tuple) -> Flight:
+    return Flight(*row)
+
+
 class FlightRepository:
+    _SQL_INSERT_AIRPORT = """
+        INSERT INTO airports (code, name, city)
+        VALUES (?, ?, ?)
+    """
+
+    _SQL_INSERT_FLIGHT = """
+        INSERT INTO flights (
+            number, departure_airport, arrival_airport,
+            departure_time, arrival_time
+        )
+        VALUES (?, ?, ?, ?, ?)
+    """
+
+    _SQL_SELECT_FLIGHTS = """
+        SELECT
+            f.number,
+            f.departure_airport,
+            f.arrival_airport,
+            f.departure_time,
+            f.arrival_time
+        FROM flights f
+    """
+
+    _SQL_SELECT_FLIGHTS_BY_DESTINATION = """
+        SELECT
+            f.number,
+            f.departure_airport,
+            f.arrival_airport,
+            f.departure_time,
+            f.arrival_time
+        FROM flights f
+        WHERE f.arrival_airport = ?
+    """
+
+    _SQL_COUNT_FLIGHTS_BY_DESTINATION = """
+        SELECT COUNT(*)
+        FROM flights
+        WHERE arrival_airport = ?
+    """
+
+    _SQL_SELECT_FLIGHT_NUMBERS_BY_DESTINATION = """
+        SELECT number
+        FROM flights
+        WHERE arrival_airport = ?
+    """
+
+    _SQL_SELECT_AIRPORTS = """
+        SELECT code, name, city
+        FROM airports
+    """
+
     def __init__(self, db_path: Path):
         self.db_path = db_path
+        # Кэш списка аэропортов живёт в пределах процесса и сбрасывается
+        # при добавлении аэропортов через этот репозиторий. Изменения,
+        # сделанные другими процессами, в нём не видны.
+        self._airports_cache: tuple[Airport, ...] | None = None
+        self._conn = self._connect()
         self._create_tables()
 
-    def _connect(self):
-        return sqlite3.connect(self.db_path)
+    def __enter__(self) -> "FlightRepository":
+        return self
 
-    def _create_tables(self):
-        conn = self._connect()
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS airports (
-                code TEXT PRIMARY KEY,
-                name TEXT NOT NULL,
-                city TEXT NOT NULL
-            )
-            """
-        )
+    def __exit__(self, *exc_info) -> None:
+        self.close()
 
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS flights (
-                number TEXT PRIMARY KEY,
-                departure_airport TEXT NOT NULL,
-                arrival_airport TEXT NOT NULL,
-                departure_time TEXT NOT NULL,
-                arrival_time TEXT NOT NULL,
-                FOREIGN KEY(departure_airport) REFERENCES airports(code),
-                FOREIGN KEY(arrival_airport) REFERENCES airports(code)
-            )
-            """
-        )
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, cached_statements=256)
+        conn.executescript(SQLITE_PRAGMAS)
+        return conn
 
-        conn.commit()
-        conn.close()
+    def close(self) -> None:
+        self._conn.close()
+
+    def _create_tables(self):
+        self._conn.executescript(SCHEMA)
 
     def add_airport(self, code: str, name: str, city: str) -> None:
-        conn = self._connect()
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """
-            INSERT INTO airports (code, name, city)
-            VALUES (?, ?, ?)
-            """,
-            (code, name, city),
-        )
+        self.add_airports([(code, name, city)])
+
+    def add_airports(self, rows: list[tuple[str, str, str]]) -> None:
+        self._airports_cache = None
 
-        conn.commit()
-        conn.close()
+        with self._conn:
+            self._conn.executemany(self._SQL_INSERT_AIRPORT, rows)
 
     def add_flight(
         self,
@@ -86,153 +168,155 @@ class FlightRepository:
         departure_time: str,
         arrival_time: str,
     ) -> None:
-        conn = self._connect()
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """
-            INSERT INTO flights (
-                number, departure_airport, arrival_airport,
-                departure_time, arrival_time
-            )
-            VALUES (?, ?, ?, ?, ?)
-            """,
-            (number, departure_airport, arrival_airport, departure_time, arrival_time),
+        self.add_flights(
+            [(number, departure_airport, arrival_airport, departure_time, arrival_time)]
         )
 
-        conn.commit()
-        conn.close()
-
-    def get_all_flights(self) -> list[Flight]:
-        conn = self._connect()
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """
-            SELECT
-                f.number,
-                f.departure_airport,
-                f.arrival_airport,
-                f.departure_time,
-                f.arrival_time
-            FROM flights f
-            """
-        )
+    def add_flights(self, rows: list[tuple[str, str, str, str, str]]) -> None:
+        with self._conn:
+            self._conn.executemany(self._SQL_INSERT_FLIGHT, rows)
 
-        rows = cursor.fetchall()
-        conn.close()
+    def get_all_flights(self) -> Iterator[Flight]:
+        cursor = self._conn.cursor()
+        cursor.row_factory = flight_row_factory
+        cursor.arraysize = FETCH_SIZE
+        cursor.execute(self._SQL_SELECT_FLIGHTS)
 
-        return [
-            Flight(
-                number=row[0],
-                departure_airport=row[1],
-                arrival_airport=row[2],
-                departure_time=row[3],
-                arrival_time=row[4],
-            )
-            for row in rows
-        ]
+        return iter_rows(cursor)
 
     def get_flights_by_destination(self, airport_code: str) -> list[Flight]:
-        conn = self._connect()
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """
-            SELECT
-                f.number,
-                f.departure_airport,
-                f.arrival_airport,
-                f.departure_time,
-                f.arrival_time
-            FROM flights f
-            WHERE f.arrival_airport = ?
-            """,
-            (airport_code,),
-        )
+        """Загружает рейсы целиком, со всеми столбцами каждой строки."""
+        cursor = self._conn.cursor()
+        cursor.row_factory = flight_row_factory
+        cursor.execute(self._SQL_SELECT_FLIGHTS_BY_DESTINATION, (airport_code,))
 
-        rows = cursor.fetchall()
-        conn.close()
+        return cursor.fetchall()
 
-        return [
-            Flight(
-                number=row[0],
-                departure_airport=row[1],
-                arrival_airport=row[2],
-                departure_time=row[3],
-                arrival_time=row[4],
-            )
-            for row in rows
-        ]
-
-    def get_all_airports(self) -> list[Airport]:
-        conn = self._connect()
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """
-            SELECT code, name, city
-            FROM airports
-            """
+    def count_flights_by_destination(self, airport_code: str) -> int:
+        cursor = self._conn.execute(
+            self._SQL_COUNT_FLIGHTS_BY_DESTINATION, (airport_code,)
+        )
+        return cursor.fetchone()[0]
+
+    def list_flight_numbers_by_destination(self, airport_code: str) -> list[str]:
+        cursor = self._conn.execute(
+            self._SQL_SELECT_FLIGHT_NUMBERS_BY_DESTINATION, (airport_code,)
+        )
+        return [row[0] for row in cursor]
+
+    def get_all_airports(self) -> Iterator[Airport]:
+        if self._airports_cache is None:
+            cursor = self._conn.cursor()
+            cursor.row_factory = airport_row_factory
+            cursor.execute(self._SQL_SELECT_AIRPORTS)
+            self._airports_cache = tuple(cursor.fetchall())
+
+        return iter(self._airports_cache)
+
+
+FLIGHTS_LINE = "+{}+{}+{}+{}+{}+".format(
+    "-" * 10, "-" * 20, "-" * 20, "-" * 16, "-" * 16
+)
+FLIGHTS_HEADER = "|{:^10}|{:^20}|{:^20}|{:^16}|{:^16}|".format(
+    "Номер",
+    "Аэропорт вылета",
+    "Аэропорт прибытия",
+    "Время вылета",
+    "Время прибытия",
+)
+FLIGHTS_ROW = "|{:<10}|{:<20}|{:<20}|{:<16}|{:<16}|".format
+
+AIRPORTS_LINE = "+{}+{}+{}+".format("-" * 6, "-" * 30, "-" * 20)
+AIRPORTS_HEADER = "|{:^6}|{:^30}|{:^20}|".format("Код", "Название", "Город")
+AIRPORTS_ROW = "|{:<6}|{:<30}|{:<20}|".format
+
+
+def display_flights(flights: Iterable[Flight], file: TextIO | None = None) -> None:
+    out = sys.stdout if file is None else file
+    row_format = FLIGHTS_ROW
+    rows = [
+        row_format(
+            flight.number,
+            flight.departure_airport,
+            flight.arrival_airport,
+            flight.departure_time,
+            flight.arrival_time,
         )
+        for flight in flights
+    ]
 
-        rows = cursor.fetchall()
-        conn.close()
+    if not rows:
+        print("Список рейсов пуст.", file=out)
+        return
+
+    line = FLIGHTS_LINE
+    out.write("\n".join([line, FLIGHTS_HEADER, line, *rows, line]) + "\n")
 
-        return [Airport(code=row[0], name=row[1], city=row[2]) for row in rows]
 
+def display_airports(airports: Iterable[Airport], file: TextIO | None = None) -> None:
+    out = sys.stdout if file is None else file
+    row_format = AIRPORTS_ROW
+    rows = [
+        row_format(airport.code, airport.name, airport.city) for airport in airports
+    ]
 
-def display_flights(flights: list[Flight]) -> None:
-    if not flights:
-        print("Список рейсов пуст.")
+    if not rows:
+        print("Список аэропортов пуст.", file=out)
         return
 
-    line = "+{}+{}+{}+{}+{}+".format("-" * 10, "-" * 20, "-" * 20, "-" * 16, "-" * 16)
+    line = AIRPORTS_LINE
+    out.write("\n".join([line, AIRPORTS_HEADER, line, *rows, line]) + "\n")
 
-    print(line)
-    print(
-        "|{:^10}|{:^20}|{:^20}|{:^16}|{:^16}|".format(
-            "Номер",
-            "Аэропорт вылета",
-            "Аэропорт прибытия",
-            "Время вылета",
-            "Время прибытия",
-        )
-    )
-    print(line)
-
-    for flight in flights:
-        print(
-            "|{:<10}|{:<20}|{:<20}|{:<16}|{:<16}|".format(
-                flight.number,
-                flight.departure_airport,
-                flight.arrival_airport,
-                flight.departure_time,
-                flight.arrival_time,
-            )
-        )
 
-    print(line)
+DEFAULT_DB = "airports.db"
 
+# Подкоманды, разбираемые без построения argparse: флаг -> имя параметра.
+# Все перечисленные параметры обязательны.
+FAST_COMMANDS = {
+    "add-airport": {"--code": "code", "--name": "name", "--city": "city"},
+    "add-flight": {
+        "--number": "number",
+        "--departure": "departure",
+        "--arrival": "arrival",
+        "--departure-time": "departure_time",
+        "--arrival-time": "arrival_time",
+    },
+    "show-flights": {},
+    "show-airports": {},
+    "select-by-destination": {"--airport": "airport"},
+}
 
-def display_airports(airports: list[Airport]) -> None:
-    if not airports:
-        print("Список аэропортов пуст.")
-        return
 
-    line = "+{}+{}+{}+".format("-" * 6, "-" * 30, "-" * 20)
+def parse_fast(argv: list[str]) -> argparse.Namespace | None:
+    # Разбирает типовой вызов вида "[--db ПУТЬ] КОМАНДА --флаг значение ...".
+    # При любом отклонении возвращает None, и строку разбирает argparse,
+    # который и сообщит об ошибке или выведет справку.
+    db = DEFAULT_DB
+    if len(argv) >= 2 and argv[0] == "--db":
+        db, argv = argv[1], argv[2:]
+
+    if not argv or argv[0] not in FAST_COMMANDS:
+        return None
 
-    print(line)
-    print("|{:^6}|{:^30}|{:^20}|".format("Код", "Название", "Город"))
-    print(line)
+    command, options = argv[0], argv[1:]
+    flags = FAST_COMMANDS[command]
+    if len(options) % 2:
+        return None
 
-    for airport in airports:
-        print("|{:<6}|{:<30}|{:<20}|".format(airport.code, airport.name, airport.city))
+    values = {}
+    for flag, value in zip(options[::2], options[1::2]):
+        dest = flags.get(flag)
+        if dest is None or dest in values or value.startswith("-"):
+            return None
+        values[dest] = value
 
-    print(line)
+    if len(values) != len(flags):
+        return None
 
+    return argparse.Namespace(db=db, command=command, **values)
 
-def main():
+
+def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(
         description="Управление авиарейсами",
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -240,8 +324,8 @@ def main():
 
     parser.add_argument(
         "--db",
-        default="airports.db",
-        help="Путь к файлу базы данных (по умолчанию: airports.db)",
+        default=DEFAULT_DB,
+        help=f"Путь к файлу базы данных (по умолчанию: {DEFAULT_DB})",
     )
 
     subparsers = parser.add_subparsers(dest="command", help="Команды")
@@ -288,42 +372,46 @@ def main():
         "--airport", required=True, help="Код аэропорта назначения"
     )
 
-    args = parser.parse_args()
+    return parser
 
-    repo = FlightRepository(Path(args.db))
 
-    if args.command == "add-airport":
-        repo.add_airport(args.code, args.name, args.city)
-        print(f"Аэропорт {args.code} добавлен.")
+def main(argv: list[str] | None = None):
+    if argv is None:
+        argv = sys.argv[1:]
 
-    elif args.command == "add-flight":
-        repo.add_flight(
-            args.number,
-            args.departure,
-            args.arrival,
-            args.departure_time,
-            args.arrival_time,
-        )
-        print(f"Рейс {args.number} добавлен.")
+    args = parse_fast(argv) or build_parser().parse_args(argv)
 
-    elif args.command == "show-flights":
-        flights = repo.get_all_flights()
-        display_flights(flights)
+    with FlightRepository(Path(args.db)) as repo:
+        if args.command == "add-airport":
+            repo.add_airport(args.code, args.name, args.city)
+            print(f"Аэропорт {args.code} добавлен.")
 
-    elif args.command == "show-airports":
-        airports = repo.get_all_airports()
-        display_airports(airports)
+        elif args.command == "add-flight":
+            repo.add_flight(
+                args.number,
+                args.departure,
+                args.arrival,
+                args.departure_time,
+                args.arrival_time,
+            )
+            print(f"Рейс {args.number} добавлен.")
 
-    elif args.command == "select-by-destination":
-        flights = repo.get_flights_by_destination(args.airport)
-        if flights:
-            print(f"Рейсы с прибытием в аэропорт {args.airport}:")
-            display_flights(flights)
-        else:
-            print(f"Рейсов с прибытием в аэропорт {args.airport} не найдено.")
+        elif args.command == "show-flights":
+            display_flights(repo.get_all_flights())
+
+        elif args.command == "show-airports":
+            display_airports(repo.get_all_airports())
 
-    else:
-        parser.print_help()
+        elif args.command == "select-by-destination":
+            flights = repo.get_flights_by_destination(args.airport)
+            if flights:
+                print(f"Рейсы с прибытием в аэропорт {args.airport}:")
+                display_flights(flights)
+            else:
+                print(f"Рейсов с прибытием в аэропорт {args.airport} не найдено.")
+
+        else:
+            build_parser().print_help()
 
 
 if __name__ == "__main__":
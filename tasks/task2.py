@@ -3,168 +3,438 @@
 
 
 import argparse
+import os
+import sys
+from collections.abc import Iterable
 from datetime import datetime
 from pathlib import Path
-
-from sqlalchemy import Column, DateTime, ForeignKey, String, create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import Session, relationship, sessionmaker
-
-Base = declarative_base()
+from typing import TextIO
+
+from sqlalchemy import Select, bindparam, create_engine, func, insert, select
+from sqlalchemy.engine import Connection, Engine, Row
+from sqlalchemy.orm import Session, selectinload, sessionmaker
+from sqlalchemy.pool import QueuePool, StaticPool
+
+# При импорте как tasks.task2 модели берутся из того же пакета; при запуске
+# файла как скрипта пакета tasks нет, и модуль лежит рядом в sys.path[0].
+try:
+    from tasks.task2_models import Airport, Base, Flight
+except ModuleNotFoundError:
+    from task2_models import Airport, Base, Flight  # type: ignore[import-not-found]
+
+# Количество строк, забираемых из курсора за одно обращение.
+FETCH_SIZE = 1000
+
+
+class DuplicateAirportError(ValueError):
+    pass
+
+
+class UnknownAirportError(ValueError):
+    pass
+
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M"
+
+
+def parse_datetime(value: str) -> datetime:
+    # Разбор строки "ГГГГ-ММ-ДД ЧЧ:ММ" срезами: strptime на каждом вызове
+    # заново разбирает формат и заметно медленнее при массовой загрузке.
+    # Остальные записи, например без ведущих нулей, разбирает strptime.
+    digits = value[0:4] + value[5:7] + value[8:10] + value[11:13] + value[14:16]
+    if (
+        len(value) != 16
+        or value[4] != "-"
+        or value[7] != "-"
+        or value[10] != " "
+        or value[13] != ":"
+        or not (digits.isascii() and digits.isdigit())
+    ):
+        try:
+            return datetime.strptime(value, DATETIME_FORMAT)
+        except ValueError:
+            raise ValueError(f"Неверный формат даты и времени: {value!r}") from None
+
+    return datetime(
+        int(value[0:4]),
+        int(value[5:7]),
+        int(value[8:10]),
+        int(value[11:13]),
+        int(value[14:16]),
+    )
 
 
-class Airport(Base):
-    __tablename__ = "airports"
+def to_datetime(value: str | datetime) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    return parse_datetime(value)
 
-    code = Column(String, primary_key=True)
-    name = Column(String, nullable=False)
-    city = Column(String, nullable=False)
 
-    departing_flights = relationship(
-        "Flight",
-        foreign_keys="Flight.departure_airport_code",
-        back_populates="departure_airport",
+class FlightRepository:
+    # Запросы строятся один раз при импорте; значения передаются через
+    # bindparam, и каждый вызов попадает в кэш скомпилированных запросов.
+    _INSERT_AIRPORT = insert(Airport.__table__)
+    _INSERT_FLIGHT = insert(Flight.__table__)
+    _SELECT_EXISTING_AIRPORT_CODE: Select = select(Airport.code).where(
+        Airport.code.in_(bindparam("codes", expanding=True))
+    )
+    _SELECT_AIRPORT_ROWS = select(Airport.__table__)
+    _SELECT_FLIGHT_ROWS = select(Flight.__table__)
+    _SELECT_FLIGHT_ROWS_BY_DESTINATION = _SELECT_FLIGHT_ROWS.where(
+        Flight.__table__.c.arrival_airport_code == bindparam("airport_code")
+    )
+    _COUNT_AIRPORTS = select(func.count()).select_from(Airport.__table__)
+    _COUNT_FLIGHTS = select(func.count()).select_from(Flight.__table__)
+
+    # Аэропорты рейсов загружаются одним дополнительным SELECT на всю пачку
+    # строк, а не ленивым запросом на каждое обращение к связи.
+    _SELECT_FLIGHTS = (
+        select(Flight)
+        .options(
+            selectinload(Flight.departure_airport),
+            selectinload(Flight.arrival_airport),
+        )
+        .execution_options(yield_per=FETCH_SIZE)
     )
-    arriving_flights = relationship(
-        "Flight",
-        foreign_keys="Flight.arrival_airport_code",
-        back_populates="arrival_airport",
+    _SELECT_FLIGHTS_BY_DESTINATION = _SELECT_FLIGHTS.where(
+        Flight.arrival_airport_code == bindparam("airport_code")
     )
+    _SELECT_AIRPORTS = select(Airport).execution_options(yield_per=FETCH_SIZE)
 
+    def __init__(
+        self,
+        db_path: Path | None = None,
+        *,
+        engine: Engine | Connection | None = None,
+    ):
+        self.db_path = db_path
+        # Движки, созданные самим репозиторием и закрываемые в close().
+        self._owned_engines: list[Engine] = []
+
+        self.engine: Engine | Connection
+        self.read_engine: Engine | Connection
+        if engine is not None:
+            # Схемой и временем жизни внешнего движка (или соединения)
+            # управляет вызывающий код.
+            self.engine = engine
+            self.read_engine = engine
+        elif db_path is not None:
+            self._create_engines(db_path)
+        else:
+            raise ValueError("Нужно указать путь к базе данных или движок")
 
-class Flight(Base):
-    __tablename__ = "flights"
+        # Если движок - соединение с уже начатой транзакцией, сессии работают
+        # внутри неё через SAVEPOINT, и их commit не фиксирует внешнюю
+        # транзакцию. Так тесты откатывают все изменения одним rollback.
+        self.Session = sessionmaker(
+            bind=self.engine, join_transaction_mode="create_savepoint"
+        )
+        self.ReadSession = sessionmaker(
+            bind=self.read_engine, join_transaction_mode="create_savepoint"
+        )
 
-    number = Column(String, primary_key=True)
-    departure_airport_code = Column(String, ForeignKey("airports.code"), nullable=False)
-    arrival_airport_code = Column(String, ForeignKey("airports.code"), nullable=False)
-    departure_time = Column(DateTime, nullable=False)
-    arrival_time = Column(DateTime, nullable=False)
+    @classmethod
+    def from_engine(cls, engine: Engine | Connection) -> "FlightRepository":
+        return cls(engine=engine)
 
-    departure_airport = relationship(
-        "Airport",
-        foreign_keys=[departure_airport_code],
-        back_populates="departing_flights",
-    )
-    arrival_airport = relationship(
-        "Airport",
-        foreign_keys=[arrival_airport_code],
-        back_populates="arriving_flights",
-    )
+    def _create_engines(self, db_path: Path) -> None:
+        url = f"sqlite:///{db_path}"
+        connect_args = {"check_same_thread": False}
 
+        if str(db_path) == ":memory:":
+            # Все обращения должны видеть одну и ту же базу в памяти.
+            writer = create_engine(url, poolclass=StaticPool, connect_args=connect_args)
+            reader = writer
+            self._owned_engines = [writer]
+        else:
+            # Запись идёт через единственное соединение, чтение - через пул,
+            # чтобы читатели не ждали друг друга и не мешали писателю.
+            writer = create_engine(
+                url,
+                poolclass=QueuePool,
+                pool_size=1,
+                max_overflow=0,
+                connect_args=connect_args,
+            )
+            reader = create_engine(
+                url,
+                poolclass=QueuePool,
+                pool_size=os.cpu_count() or 1,
+                connect_args=connect_args,
+            )
+            self._owned_engines = [reader, writer]
 
-class FlightRepository:
-    def __init__(self, db_path: Path):
-        self.db_path = db_path
-        self.engine = create_engine(f"sqlite:///{db_path}")
-        Base.metadata.create_all(self.engine)
-        self.Session = sessionmaker(bind=self.engine)
+        self.engine = writer
+        self.read_engine = reader
+
+        with writer.connect() as conn:
+            conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+
+        # create_all не добавляет индексы в уже существующие таблицы,
+        # поэтому в старых базах они создаются отдельно.
+        with writer.begin() as conn:
+            Base.metadata.create_all(conn)
+            for index in Flight.__table__.indexes:
+                index.create(conn, checkfirst=True)
+
+    def __enter__(self) -> "FlightRepository":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        for engine in self._owned_engines:
+            engine.dispose()
 
     def _get_session(self) -> Session:
         return self.Session()
 
+    def _get_read_session(self) -> Session:
+        return self.ReadSession()
+
     def add_airport(self, code: str, name: str, city: str) -> None:
-        with self._get_session() as session:
-            airport = Airport(code=code, name=name, city=city)
-            session.add(airport)
-            session.commit()
+        self.add_airports([(code, name, city)])
+
+    def add_airports(self, rows: list[tuple[str, str, str]]) -> None:
+        # Пустой список параметров SQLAlchemy выполнил бы как одиночный
+        # INSERT ... DEFAULT VALUES.
+        if not rows:
+            return
+
+        params = [
+            {"code": code, "name": name, "city": city} for code, name, city in rows
+        ]
+
+        # Повтор кода внутри одного пакета тоже дубликат, хотя в базе его
+        # ещё нет и запрос ниже его не найдёт.
+        codes = [row[0] for row in rows]
+        if len(set(codes)) != len(codes):
+            seen: set[str] = set()
+            for code in codes:
+                if code in seen:
+                    raise DuplicateAirportError(
+                        f"Аэропорт с кодом {code} указан несколько раз"
+                    )
+                seen.add(code)
+
+        # Все строки вставляются одним executemany в одной транзакции.
+        # Существующие коды ищутся по первичному ключу заранее, чтобы не
+        # доводить дело до нарушения ограничения и отката вставки.
+        with self.Session.begin() as session:
+            existing = session.scalar(
+                self._SELECT_EXISTING_AIRPORT_CODE, {"codes": codes}
+            )
+            if existing is not None:
+                raise DuplicateAirportError(
+                    f"Аэропорт с кодом {existing} уже существует"
+                )
+            session.execute(self._INSERT_AIRPORT, params)
 
     def add_flight(
         self,
         number: str,
         departure_airport_code: str,
         arrival_airport_code: str,
-        departure_time_str: str,
-        arrival_time_str: str,
+        departure_time: str | datetime,
+        arrival_time: str | datetime,
+    ) -> None:
+        self.add_flights(
+            [
+                (
+                    number,
+                    departure_airport_code,
+                    arrival_airport_code,
+                    departure_time,
+                    arrival_time,
+                )
+            ]
+        )
+
+    def add_flights(
+        self, rows: list[tuple[str, str, str, str | datetime, str | datetime]]
     ) -> None:
-        with self._get_session() as session:
-            departure_time = datetime.strptime(departure_time_str, "%Y-%m-%d %H:%M")
-            arrival_time = datetime.strptime(arrival_time_str, "%Y-%m-%d %H:%M")
-
-            flight = Flight(
-                number=number,
-                departure_airport_code=departure_airport_code,
-                arrival_airport_code=arrival_airport_code,
-                departure_time=departure_time,
-                arrival_time=arrival_time,
+        if not rows:
+            return
+
+        # Даты разбираются до начала транзакции: ошибка формата не должна
+        # оставлять открытую сессию, а драйверу передаются готовые datetime.
+        # Уже готовые datetime передаются как есть.
+        params = [
+            {
+                "number": number,
+                "departure_airport_code": departure,
+                "arrival_airport_code": arrival,
+                "departure_time": to_datetime(departure_time),
+                "arrival_time": to_datetime(arrival_time),
+            }
+            for number, departure, arrival, departure_time, arrival_time in rows
+        ]
+
+        # SQLite не проверяет внешние ключи без PRAGMA foreign_keys, поэтому
+        # коды аэропортов всех рейсов проверяются одним запросом к первичному
+        # ключу.
+        codes: set[str] = {row[1] for row in rows}
+        codes.update(row[2] for row in rows)
+
+        with self.Session.begin() as session:
+            known = set(
+                session.scalars(
+                    self._SELECT_EXISTING_AIRPORT_CODE, {"codes": list(codes)}
+                )
             )
-            session.add(flight)
-            session.commit()
-
-    def get_all_flights(self):
-        with self._get_session() as session:
-            flights = session.query(Flight).all()
-            return flights
-
-    def get_flights_by_destination(self, airport_code: str):
-        with self._get_session() as session:
-            flights = (
-                session.query(Flight)
-                .filter(Flight.arrival_airport_code == airport_code)
-                .all()
+            unknown = codes - known
+            if unknown:
+                raise UnknownAirportError(f"Аэропорт с кодом {min(unknown)} не найден")
+            session.execute(self._INSERT_FLIGHT, params)
+
+    def get_all_flights(self) -> list[Flight]:
+        with self._get_read_session() as session:
+            return list(session.scalars(self._SELECT_FLIGHTS))
+
+    def get_flights_by_destination(self, airport_code: str) -> list[Flight]:
+        with self._get_read_session() as session:
+            return list(
+                session.scalars(
+                    self._SELECT_FLIGHTS_BY_DESTINATION,
+                    {"airport_code": airport_code},
+                )
             )
-            return flights
 
-    def get_all_airports(self):
-        with self._get_session() as session:
-            airports = session.query(Airport).all()
-            return airports
+    def get_all_airports(self) -> list[Airport]:
+        with self._get_read_session() as session:
+            return list(session.scalars(self._SELECT_AIRPORTS))
 
+    # Чтение через Core: строки Row без identity map и инструментированных
+    # атрибутов ORM, когда нужны только значения столбцов.
+    def _read_rows(self, stmt, params: dict | None = None) -> list[Row]:
+        with self._get_read_session() as session:
+            return list(session.connection().execute(stmt, params))
 
-def display_flights(flights: list[Flight]) -> None:
-    if not flights:
-        print("Список рейсов пуст.")
-        return
+    def get_all_airports_core(self) -> list[Row]:
+        return self._read_rows(self._SELECT_AIRPORT_ROWS)
 
-    line = "+{}+{}+{}+{}+{}+".format("-" * 10, "-" * 20, "-" * 20, "-" * 16, "-" * 16)
+    def get_all_flights_core(self) -> list[Row]:
+        return self._read_rows(self._SELECT_FLIGHT_ROWS)
 
-    print(line)
-    print(
-        "|{:^10}|{:^20}|{:^20}|{:^16}|{:^16}|".format(
-            "Номер",
-            "Аэропорт вылета",
-            "Аэропорт прибытия",
-            "Время вылета",
-            "Время прибытия",
+    def get_flights_by_destination_core(self, airport_code: str) -> list[Row]:
+        return self._read_rows(
+            self._SELECT_FLIGHT_ROWS_BY_DESTINATION, {"airport_code": airport_code}
         )
-    )
-    print(line)
-
-    for flight in flights:
-        departure_time = flight.departure_time.strftime("%Y-%m-%d %H:%M")
-        arrival_time = flight.arrival_time.strftime("%Y-%m-%d %H:%M")
-
-        print(
-            "|{:<10}|{:<20}|{:<20}|{:<16}|{:<16}|".format(
-                flight.number,
-                flight.departure_airport_code,
-                flight.arrival_airport_code,
-                departure_time,
-                arrival_time,
-            )
+
+    def count_airports(self) -> int:
+        with self._get_read_session() as session:
+            return session.connection().execute(self._COUNT_AIRPORTS).scalar_one()
+
+    def count_flights(self) -> int:
+        with self._get_read_session() as session:
+            return session.connection().execute(self._COUNT_FLIGHTS).scalar_one()
+
+
+FLIGHTS_LINE = "+{}+{}+{}+{}+{}+".format(
+    "-" * 10, "-" * 20, "-" * 20, "-" * 16, "-" * 16
+)
+FLIGHTS_HEADER = "|{:^10}|{:^20}|{:^20}|{:^16}|{:^16}|".format(
+    "Номер",
+    "Аэропорт вылета",
+    "Аэропорт прибытия",
+    "Время вылета",
+    "Время прибытия",
+)
+# Время "ГГГГ-ММ-ДД ЧЧ:ММ" занимает ровно 16 символов и не требует выравнивания.
+FLIGHTS_ROW = "|{:<10}|{:<20}|{:<20}|{:%Y-%m-%d %H:%M}|{:%Y-%m-%d %H:%M}|".format
+
+AIRPORTS_LINE = "+{}+{}+{}+".format("-" * 6, "-" * 30, "-" * 20)
+AIRPORTS_HEADER = "|{:^6}|{:^30}|{:^20}|".format("Код", "Название", "Город")
+AIRPORTS_ROW = "|{:<6}|{:<30}|{:<20}|".format
+
+
+def display_flights(flights: Iterable[Flight], file: TextIO | None = None) -> None:
+    out = sys.stdout if file is None else file
+    row_format = FLIGHTS_ROW
+    rows = [
+        row_format(
+            flight.number,
+            flight.departure_airport_code,
+            flight.arrival_airport_code,
+            flight.departure_time,
+            flight.arrival_time,
         )
+        for flight in flights
+    ]
+
+    if not rows:
+        print("Список рейсов пуст.", file=out)
+        return
+
+    line = FLIGHTS_LINE
+    out.write("\n".join([line, FLIGHTS_HEADER, line, *rows, line]) + "\n")
 
-    print(line)
 
+def display_airports(airports: Iterable[Airport], file: TextIO | None = None) -> None:
+    out = sys.stdout if file is None else file
+    row_format = AIRPORTS_ROW
+    rows = [
+        row_format(airport.code, airport.name, airport.city) for airport in airports
+    ]
 
-def display_airports(airports: list[Airport]) -> None:
-    if not airports:
-        print("Список аэропортов пуст.")
+    if not rows:
+        print("Список аэропортов пуст.", file=out)
         return
 
-    line = "+{}+{}+{}+".format("-" * 6, "-" * 30, "-" * 20)
+    line = AIRPORTS_LINE
+    out.write("\n".join([line, AIRPORTS_HEADER, line, *rows, line]) + "\n")
+
 
-    print(line)
-    print("|{:^6}|{:^30}|{:^20}|".format("Код", "Название", "Город"))
-    print(line)
+DEFAULT_DB = "airports_sa.db"
 
-    for airport in airports:
-        print("|{:<6}|{:<30}|{:<20}|".format(airport.code, airport.name, airport.city))
+# Подкоманды, разбираемые без построения argparse: флаг -> имя параметра.
+# Все перечисленные параметры обязательны.
+FAST_COMMANDS = {
+    "add-airport": {"--code": "code", "--name": "name", "--city": "city"},
+    "add-flight": {
+        "--number": "number",
+        "--departure": "departure",
+        "--arrival": "arrival",
+        "--departure-time": "departure_time",
+        "--arrival-time": "arrival_time",
+    },
+    "show-flights": {},
+    "show-airports": {},
+    "select-by-destination": {"--airport": "airport"},
+}
 
-    print(line)
 
+def parse_fast(argv: list[str]) -> argparse.Namespace | None:
+    # Разбирает типовой вызов вида "[--db ПУТЬ] КОМАНДА --флаг значение ...".
+    # При любом отклонении возвращает None, и строку разбирает argparse,
+    # который и сообщит об ошибке или выведет справку.
+    db = DEFAULT_DB
+    if len(argv) >= 2 and argv[0] == "--db":
+        db, argv = argv[1], argv[2:]
 
-def main():
+    if not argv or argv[0] not in FAST_COMMANDS:
+        return None
+
+    command, options = argv[0], argv[1:]
+    flags = FAST_COMMANDS[command]
+    if len(options) % 2:
+        return None
+
+    values = {}
+    for flag, value in zip(options[::2], options[1::2]):
+        dest = flags.get(flag)
+        if dest is None or dest in values or value.startswith("-"):
+            return None
+        values[dest] = value
+
+    if len(values) != len(flags):
+        return None
+
+    return argparse.Namespace(db=db, command=command, **values)
+
+
+def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(
         description="Управление авиарейсами (SQLAlchemy)",
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -172,8 +442,8 @@ def main():
 
     parser.add_argument(
         "--db",
-        default="airports_sa.db",
-        help="Путь к файлу базы данных (по умолчанию: airports_sa.db)",
+        default=DEFAULT_DB,
+        help=f"Путь к файлу базы данных (по умолчанию: {DEFAULT_DB})",
     )
 
     subparsers = parser.add_subparsers(dest="command", help="Команды")
@@ -215,42 +485,48 @@ def main():
         "--airport", required=True, help="Код аэропорта назначения"
     )
 
-    args = parser.parse_args()
+    return parser
 
-    repo = FlightRepository(Path(args.db))
 
-    if args.command == "add-airport":
-        repo.add_airport(args.code, args.name, args.city)
-        print(f"Аэропорт {args.code} добавлен.")
+def main(argv: list[str] | None = None):
+    if argv is None:
+        argv = sys.argv[1:]
 
-    elif args.command == "add-flight":
-        repo.add_flight(
-            args.number,
-            args.departure,
-            args.arrival,
-            args.departure_time,
-            args.arrival_time,
-        )
-        print(f"Рейс {args.number} добавлен.")
+    args = parse_fast(argv) or build_parser().parse_args(argv)
 
-    elif args.command == "show-flights":
-        flights = repo.get_all_flights()
-        display_flights(flights)
+    with FlightRepository(Path(args.db)) as repo:
+        if args.command == "add-airport":
+            repo.add_airport(args.code, args.name, args.city)
+            print(f"Аэропорт {args.code} добавлен.")
 
-    elif args.command == "show-airports":
-        airports = repo.get_all_airports()
-        display_airports(airports)
+        elif args.command == "add-flight":
+            repo.add_flight(
+                args.number,
+                args.departure,
+                args.arrival,
+                args.departure_time,
+                args.arrival_time,
+            )
+            print(f"Рейс {args.number} добавлен.")
 
-    elif args.command == "select-by-destination":
-        flights = repo.get_flights_by_destination(args.airport)
-        if flights:
-            print(f"Рейсы с прибытием в аэропорт {args.airport}:")
+        elif args.command == "show-flights":
+            flights = repo.get_all_flights()
             display_flights(flights)
-        else:
-            print(f"Рейсов с прибытием в аэропорт {args.airport} не найдено.")
 
-    else:
-        parser.print_help()
+        elif args.command == "show-airports":
+            airports = repo.get_all_airports()
+            display_airports(airports)
+
+        elif args.command == "select-by-destination":
+            flights = repo.get_flights_by_destination(args.airport)
+            if flights:
+                print(f"Рейсы с прибытием в аэропорт {args.airport}:")
+                display_flights(flights)
+            else:
+                print(f"Рейсов с прибытием в аэропорт {args.airport} не найдено.")
+
+        else:
+            build_parser().print_help()
 
 
 if __name__ == "__main__":
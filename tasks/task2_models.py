@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+from sqlalchemy import Column, DateTime, ForeignKey, String
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import relationship
+
+Base = declarative_base()
+
+
+class Airport(Base):
+    __tablename__ = "airports"
+
+    code = Column(String, primary_key=True)
+    name = Column(String, nullable=False)
+    city = Column(String, nullable=False)
+
+    departing_flights = relationship(
+        "Flight",
+        foreign_keys="Flight.departure_airport_code",
+        back_populates="departure_airport",
+    )
+    arriving_flights = relationship(
+        "Flight",
+        foreign_keys="Flight.arrival_airport_code",
+        back_populates="arrival_airport",
+    )
+
+
+class Flight(Base):
+    __tablename__ = "flights"
+
+    number = Column(String, primary_key=True)
+    departure_airport_code = Column(String, ForeignKey("airports.code"), nullable=False)
+    arrival_airport_code = Column(
+        String, ForeignKey("airports.code"), nullable=False, index=True
+    )
+    departure_time = Column(DateTime, nullable=False)
+    arrival_time = Column(DateTime, nullable=False)
+
+    departure_airport = relationship(
+        "Airport",
+        foreign_keys=[departure_airport_code],
+        back_populates="departing_flights",
+    )
+    arrival_airport = relationship(
+        "Airport",
+        foreign_keys=[arrival_airport_code],
+        back_populates="arriving_flights",
+    )
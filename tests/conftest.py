@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+import sqlite3
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import StaticPool
+
+from tasks.task2_models import Base
+
+# Тестовым базам не нужна устойчивость к сбоям: отключаем fsync на каждый
+# commit и держим временные данные в памяти. locking_mode=EXCLUSIVE не
+# используется: репозиторий на файле читает через отдельный пул соединений,
+# и монопольная блокировка писателя не пустила бы читателей.
+TEST_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-64000",
+)
+
+
+@event.listens_for(Engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+
+    cursor = dbapi_connection.cursor()
+    for pragma in TEST_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+
+@pytest.fixture(scope="session")
+def engine():
+    engine = create_engine(
+        "sqlite://",
+        poolclass=StaticPool,
+        connect_args={"check_same_thread": False},
+    )
+
+    # pysqlite сам начинает и завершает транзакции и ломает SAVEPOINT:
+    # отключаем это поведение и начинаем транзакции явно.
+    @event.listens_for(engine, "connect")
+    def disable_pysqlite_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def begin_transaction(conn):
+        conn.exec_driver_sql("BEGIN")
+
+    # База только что создана и пуста: проверять наличие таблиц незачем.
+    Base.metadata.create_all(engine, checkfirst=False)
+    yield engine
+    engine.dispose()
@@ -2,39 +2,45 @@
 # -*- coding: utf-8 -*-
 
 
-import os
-import tempfile
+import sqlite3
+from io import StringIO
 from pathlib import Path
 
 import pytest
-from task1 import Airport, Flight, FlightRepository
+from task1 import Airport, Flight, FlightRepository, build_parser, parse_fast
 
 
 class TestFlightRepositoryV1:
     @pytest.fixture
-    def temp_db_path(self):
-        fd, db_path = tempfile.mkstemp(suffix=".db")
-        os.close(fd)
-        yield Path(db_path)
-        try:
-            if os.path.exists(db_path):
-                os.unlink(db_path)
-        except (OSError, PermissionError):
-            pass
+    def repo(self):
+        with FlightRepository(Path(":memory:")) as repo:
+            yield repo
 
-    @pytest.fixture
-    def repo(self, temp_db_path):
-        return FlightRepository(temp_db_path)
+    def test_data_persists_on_disk(self, tmp_path):
+        db_path = tmp_path / "airports.db"
+        with FlightRepository(db_path) as repo:
+            repo.add_airport("SVO", "Шереметьево", "Москва")
+        with FlightRepository(db_path) as repo:
+            airports = list(repo.get_all_airports())
+        assert airports == [Airport(code="SVO", name="Шереметьево", city="Москва")]
+
+    def test_schema_recreated_after_file_removed(self, tmp_path):
+        db_path = tmp_path / "airports.db"
+        FlightRepository(db_path).close()
+        db_path.unlink()
+        with FlightRepository(db_path) as repo:
+            repo.add_airport("SVO", "Шереметьево", "Москва")
+            assert len(list(repo.get_all_airports())) == 1
 
     def test_create_tables(self, repo):
         repo.add_airport("TEST", "Тестовый аэропорт", "Тестовый город")
-        airports = repo.get_all_airports()
+        airports = list(repo.get_all_airports())
         assert len(airports) == 1
         assert airports[0].code == "TEST"
 
     def test_add_airport(self, repo):
         repo.add_airport("SVO", "Шереметьево", "Москва")
-        airports = repo.get_all_airports()
+        airports = list(repo.get_all_airports())
         assert len(airports) == 1
         airport = airports[0]
         assert airport.code == "SVO"
@@ -47,18 +53,23 @@ class TestFlightRepositoryV1:
             ("LED", "Пулково", "Санкт-Петербург"),
             ("DME", "Домодедово", "Москва"),
         ]
-        for code, name, city in airports_data:
-            repo.add_airport(code, name, city)
-        airports = repo.get_all_airports()
+        repo.add_airports(airports_data)
+        airports = list(repo.get_all_airports())
         assert len(airports) == 3
         codes = {a.code for a in airports}
         assert codes == {"SVO", "LED", "DME"}
 
+    def test_airports_cache_invalidated_on_add(self, repo):
+        repo.add_airport("SVO", "Шереметьево", "Москва")
+        assert [a.code for a in repo.get_all_airports()] == ["SVO"]
+        repo.add_airport("LED", "Пулково", "Санкт-Петербург")
+        assert {a.code for a in repo.get_all_airports()} == {"SVO", "LED"}
+
     def test_add_flight(self, repo):
         repo.add_airport("SVO", "Шереметьево", "Москва")
         repo.add_airport("LED", "Пулково", "Санкт-Петербург")
         repo.add_flight("SU100", "SVO", "LED", "2024-05-20 10:00", "2024-05-20 11:30")
-        flights = repo.get_all_flights()
+        flights = list(repo.get_all_flights())
         assert len(flights) == 1
         flight = flights[0]
         assert flight.number == "SU100"
@@ -67,17 +78,37 @@ class TestFlightRepositoryV1:
         assert flight.departure_time == "2024-05-20 10:00"
         assert flight.arrival_time == "2024-05-20 11:30"
 
-    def test_get_flights_by_destination(self, repo):
+    def test_add_empty_batches(self, repo):
+        repo.add_airports([])
+        repo.add_flights([])
+        assert list(repo.get_all_airports()) == []
+        assert list(repo.get_all_flights()) == []
+
+    def test_add_flights_is_atomic(self, repo):
         repo.add_airport("SVO", "Шереметьево", "Москва")
         repo.add_airport("LED", "Пулково", "Санкт-Петербург")
-        repo.add_airport("DME", "Домодедово", "Москва")
+        flights_data = [
+            ("SU100", "SVO", "LED", "2024-05-20 10:00", "2024-05-20 11:30"),
+            ("SU100", "LED", "SVO", "2024-05-20 14:00", "2024-05-20 15:30"),
+        ]
+        with pytest.raises(sqlite3.IntegrityError):
+            repo.add_flights(flights_data)
+        assert list(repo.get_all_flights()) == []
+
+    def test_get_flights_by_destination(self, repo):
+        repo.add_airports(
+            [
+                ("SVO", "Шереметьево", "Москва"),
+                ("LED", "Пулково", "Санкт-Петербург"),
+                ("DME", "Домодедово", "Москва"),
+            ]
+        )
         flights_data = [
             ("SU100", "SVO", "LED", "2024-05-20 10:00", "2024-05-20 11:30"),
             ("SU200", "LED", "DME", "2024-05-20 14:00", "2024-05-20 15:30"),
             ("SU300", "SVO", "DME", "2024-05-20 16:00", "2024-05-20 16:45"),
         ]
-        for number, departure, arrival, dep_time, arr_time in flights_data:
-            repo.add_flight(number, departure, arrival, dep_time, arr_time)
+        repo.add_flights(flights_data)
         moscow_flights = repo.get_flights_by_destination("DME")
         assert len(moscow_flights) == 2
         flight_numbers = {f.number for f in moscow_flights}
@@ -88,19 +119,39 @@ class TestFlightRepositoryV1:
         empty_flights = repo.get_flights_by_destination("XXX")
         assert len(empty_flights) == 0
 
+    def test_count_and_numbers_by_destination(self, repo):
+        repo.add_airports(
+            [
+                ("SVO", "Шереметьево", "Москва"),
+                ("LED", "Пулково", "Санкт-Петербург"),
+                ("DME", "Домодедово", "Москва"),
+            ]
+        )
+        repo.add_flights(
+            [
+                ("SU100", "SVO", "LED", "2024-05-20 10:00", "2024-05-20 11:30"),
+                ("SU200", "LED", "DME", "2024-05-20 14:00", "2024-05-20 15:30"),
+                ("SU300", "SVO", "DME", "2024-05-20 16:00", "2024-05-20 16:45"),
+            ]
+        )
+        assert repo.count_flights_by_destination("DME") == 2
+        assert repo.count_flights_by_destination("XXX") == 0
+        assert set(repo.list_flight_numbers_by_destination("DME")) == {
+            "SU200",
+            "SU300",
+        }
+        assert repo.list_flight_numbers_by_destination("XXX") == []
+
     def test_empty_repository(self, repo):
-        airports = repo.get_all_airports()
-        flights = repo.get_all_flights()
+        airports = list(repo.get_all_airports())
+        flights = list(repo.get_all_flights())
         assert len(airports) == 0
         assert len(flights) == 0
 
     def test_duplicate_airport(self, repo):
         repo.add_airport("SVO", "Шереметьево", "Москва")
-        try:
+        with pytest.raises(sqlite3.IntegrityError):
             repo.add_airport("SVO", "Другое название", "Другой город")
-            pytest.fail("Expected exception for duplicate airport")
-        except Exception:
-            pass
 
     def test_airport_dataclass(self):
         airport = Airport(code="TEST", name="Тест", city="Город")
@@ -133,15 +184,71 @@ class TestFlightRepositoryV1:
         assert flight == flight2
 
 
+class TestCommandLine:
+    @pytest.mark.parametrize(
+        "argv",
+        [
+            [
+                "add-airport",
+                "--code",
+                "SVO",
+                "--name",
+                "Шереметьево",
+                "--city",
+                "Москва",
+            ],
+            [
+                "--db",
+                "other.db",
+                "add-flight",
+                "--arrival-time",
+                "2024-05-20 11:30",
+                "--number",
+                "SU100",
+                "--departure",
+                "SVO",
+                "--arrival",
+                "LED",
+                "--departure-time",
+                "2024-05-20 10:00",
+            ],
+            ["show-flights"],
+            ["select-by-destination", "--airport", "LED"],
+        ],
+    )
+    def test_parse_fast_matches_argparse(self, argv):
+        assert parse_fast(argv) == build_parser().parse_args(argv)
+
+    @pytest.mark.parametrize(
+        "argv",
+        [
+            [],
+            ["--help"],
+            ["show-flights", "--help"],
+            ["add-airport", "--code", "SVO"],
+            ["select-by-destination", "--airport", "LED", "--airport", "DME"],
+        ],
+    )
+    def test_parse_fast_falls_back(self, argv):
+        assert parse_fast(argv) is None
+
+
 class TestDisplayFunctions:
-    def test_display_flights_empty(self, capsys):
+    def test_display_flights_empty(self):
         from task1 import display_flights
 
-        display_flights([])
-        captured = capsys.readouterr()
-        assert "Список рейсов пуст." in captured.out
+        output = StringIO()
+        display_flights([], file=output)
+        assert "Список рейсов пуст." in output.getvalue()
+
+    def test_display_flights_empty_iterator(self):
+        from task1 import display_flights
+
+        output = StringIO()
+        display_flights(iter([]), file=output)
+        assert "Список рейсов пуст." in output.getvalue()
 
-    def test_display_flights_with_data(self, capsys):
+    def test_display_flights_with_data(self):
         from task1 import Flight, display_flights
 
         flights = [
@@ -153,22 +260,35 @@ class TestDisplayFunctions:
                 arrival_time="2024-05-20 11:30",
             )
         ]
-        display_flights(flights)
-        captured = capsys.readouterr()
-        assert "SU100" in captured.out
-        assert "SVO" in captured.out
-        assert "LED" in captured.out
-        assert "2024-05-20 10:00" in captured.out
-        assert "2024-05-20 11:30" in captured.out
-        assert "Номер" in captured.out
-        assert "Аэропорт вылета" in captured.out
+        output = StringIO()
+        display_flights(flights, file=output)
+        assert "SU100" in output.getvalue()
+        assert "SVO" in output.getvalue()
+        assert "LED" in output.getvalue()
+        assert "2024-05-20 10:00" in output.getvalue()
+        assert "2024-05-20 11:30" in output.getvalue()
+        assert "Номер" in output.getvalue()
+        assert "Аэропорт вылета" in output.getvalue()
 
-    def test_display_airports_empty(self, capsys):
+    def test_display_airports_empty(self):
         from task1 import display_airports
 
-        display_airports([])
-        captured = capsys.readouterr()
-        assert "Список аэропортов пуст." in captured.out
+        output = StringIO()
+        display_airports([], file=output)
+        assert "Список аэропортов пуст." in output.getvalue()
+
+    def test_display_to_empty_sized_stream(self):
+        from task1 import display_airports
+
+        # Пустой поток с __len__ ложен в логическом контексте, но вывод
+        # должен идти именно в него, а не в sys.stdout.
+        class Buffer(StringIO):
+            def __len__(self):
+                return len(self.getvalue())
+
+        output = Buffer()
+        display_airports([], file=output)
+        assert "Список аэропортов пуст." in output.getvalue()
 
     def test_display_airports_with_data(self, capsys):
         from task1 import Airport, display_airports
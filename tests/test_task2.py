@@ -2,41 +2,117 @@
 # -*- coding: utf-8 -*-
 
 
-import os
-import tempfile
+import sqlite3
 from datetime import datetime
-from pathlib import Path
+from io import StringIO
 
 import pytest
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
 
 from tasks.task2 import (
-    Airport,
-    Flight,
+    DuplicateAirportError,
     FlightRepository,
+    UnknownAirportError,
+    build_parser,
     display_airports,
     display_flights,
+    parse_datetime,
+    parse_fast,
 )
+from tasks.task2_models import Airport, Flight
+
+AIRPORT_ROWS = [
+    ("SVO", "Шереметьево", "Москва"),
+    ("LED", "Пулково", "Санкт-Петербург"),
+    ("DME", "Домодедово", "Москва"),
+]
+
+FLIGHT_ROWS = [
+    (
+        "SU100",
+        "SVO",
+        "LED",
+        datetime(2024, 5, 20, 10, 0),
+        datetime(2024, 5, 20, 11, 30),
+    ),
+    (
+        "SU200",
+        "LED",
+        "DME",
+        datetime(2024, 5, 20, 14, 0),
+        datetime(2024, 5, 20, 15, 30),
+    ),
+    (
+        "SU300",
+        "SVO",
+        "DME",
+        datetime(2024, 5, 20, 16, 0),
+        datetime(2024, 5, 20, 16, 45),
+    ),
+]
 
 
 class TestFlightRepositorySQLAlchemy:
     @pytest.fixture
-    def temp_db_path(self):
-        fd, db_path = tempfile.mkstemp(suffix=".db")
-        os.close(fd)
-        yield Path(db_path)
-        try:
-            if os.path.exists(db_path):
-                os.unlink(db_path)
-        except (OSError, PermissionError):
-            pass
+    def repo(self, engine):
+        # Каждый тест работает внутри внешней транзакции, которая
+        # откатывается в конце; commit репозитория фиксирует лишь SAVEPOINT.
+        with engine.connect() as connection:
+            transaction = connection.begin()
+            yield FlightRepository.from_engine(connection)
+            transaction.rollback()
 
-    @pytest.fixture
-    def repo(self, temp_db_path):
-        return FlightRepository(temp_db_path)
+    def test_data_persists_on_disk(self, tmp_path):
+        db_path = tmp_path / "airports_sa.db"
+        with FlightRepository(db_path) as repo:
+            repo.add_airports(AIRPORT_ROWS)
+            repo.add_flights(FLIGHT_ROWS)
+        with FlightRepository(db_path) as repo:
+            assert repo.count_airports() == 3
+            assert repo.count_flights() == 3
+            flights = repo.get_flights_by_destination("DME")
+        assert {flight.number for flight in flights} == {"SU200", "SU300"}
+        assert flights[0].arrival_airport.name == "Домодедово"
+
+    def test_index_added_to_existing_database(self, tmp_path):
+        db_path = tmp_path / "old.db"
+        with sqlite3.connect(db_path) as conn:
+            conn.executescript(
+                """
+                CREATE TABLE airports (
+                    code VARCHAR NOT NULL PRIMARY KEY,
+                    name VARCHAR NOT NULL,
+                    city VARCHAR NOT NULL
+                );
+                CREATE TABLE flights (
+                    number VARCHAR NOT NULL PRIMARY KEY,
+                    departure_airport_code VARCHAR NOT NULL
+                        REFERENCES airports (code),
+                    arrival_airport_code VARCHAR NOT NULL
+                        REFERENCES airports (code),
+                    departure_time DATETIME NOT NULL,
+                    arrival_time DATETIME NOT NULL
+                );
+                """
+            )
+        conn.close()
+
+        FlightRepository(db_path).close()
+
+        with sqlite3.connect(db_path) as conn:
+            plan = conn.execute(
+                "EXPLAIN QUERY PLAN SELECT number FROM flights "
+                "WHERE arrival_airport_code = ?",
+                ("LED",),
+            ).fetchall()
+        conn.close()
+        assert "ix_flights_arrival_airport_code" in plan[0][-1]
 
     def test_create_tables(self, repo):
         repo.add_airport("TEST", "Тестовый аэропорт", "Тестовый город")
-        airports = repo.get_all_airports()
+        airports = repo.get_all_airports_core()
         assert len(airports) == 1
         assert airports[0].code == "TEST"
 
@@ -51,14 +127,8 @@ class TestFlightRepositorySQLAlchemy:
         assert airport.city == "Москва"
 
     def test_add_multiple_airports(self, repo):
-        airports_data = [
-            ("SVO", "Шереметьево", "Москва"),
-            ("LED", "Пулково", "Санкт-Петербург"),
-            ("DME", "Домодедово", "Москва"),
-        ]
-        for code, name, city in airports_data:
-            repo.add_airport(code, name, city)
-        airports = repo.get_all_airports()
+        repo.add_airports(AIRPORT_ROWS)
+        airports = repo.get_all_airports_core()
         assert len(airports) == 3
         codes = {a.code for a in airports}
         assert codes == {"SVO", "LED", "DME"}
@@ -66,7 +136,7 @@ class TestFlightRepositorySQLAlchemy:
     def test_add_flight(self, repo):
         repo.add_airport("SVO", "Шереметьево", "Москва")
         repo.add_airport("LED", "Пулково", "Санкт-Петербург")
-        repo.add_flight("SU100", "SVO", "LED", "2024-05-20 10:00", "2024-05-20 11:30")
+        repo.add_flight(*FLIGHT_ROWS[0])
         flights = repo.get_all_flights()
         assert len(flights) == 1
         flight = flights[0]
@@ -74,18 +144,14 @@ class TestFlightRepositorySQLAlchemy:
         assert flight.number == "SU100"
         assert flight.departure_airport_code == "SVO"
         assert flight.arrival_airport_code == "LED"
-        assert isinstance(flight.departure_time, datetime)
-        assert flight.departure_time.year == 2024
-        assert flight.departure_time.month == 5
-        assert flight.departure_time.day == 20
-        assert flight.departure_time.hour == 10
-        assert flight.departure_time.minute == 0
-        assert isinstance(flight.arrival_time, datetime)
-        assert flight.arrival_time.year == 2024
-        assert flight.arrival_time.month == 5
-        assert flight.arrival_time.day == 20
-        assert flight.arrival_time.hour == 11
-        assert flight.arrival_time.minute == 30
+        assert flight.departure_time == datetime(2024, 5, 20, 10, 0)
+        assert flight.arrival_time == datetime(2024, 5, 20, 11, 30)
+
+    def test_add_flight_unknown_airport(self, repo):
+        repo.add_airport("SVO", "Шереметьево", "Москва")
+        with pytest.raises(UnknownAirportError):
+            repo.add_flight(*FLIGHT_ROWS[0])
+        assert repo.get_all_flights_core() == []
 
     def test_relationships_in_session(self, repo):
         with repo._get_session() as session:
@@ -106,56 +172,80 @@ class TestFlightRepositorySQLAlchemy:
             session.add(flight)
             session.commit()
 
+            # Связи подгружаются вместе с рейсом, а не отдельным SELECT
+            # на каждое обращение к атрибуту.
+            flight = session.scalars(
+                select(Flight).options(
+                    selectinload(Flight.departure_airport),
+                    selectinload(Flight.arrival_airport),
+                )
+            ).one()
             assert flight.departure_airport is not None
             assert flight.arrival_airport is not None
             assert flight.departure_airport.code == "SVO"
             assert flight.arrival_airport.code == "LED"
 
+    def test_flight_airports_loaded_eagerly(self, repo):
+        repo.add_airports(
+            [("SVO", "Шереметьево", "Москва"), ("LED", "Пулково", "Санкт-Петербург")]
+        )
+        repo.add_flight("SU100", "SVO", "LED", "2024-05-20 10:00", "2024-05-20 11:30")
+        # Сессия репозитория уже закрыта: ленивая загрузка связи
+        # завершилась бы DetachedInstanceError.
+        for flights in (repo.get_all_flights(), repo.get_flights_by_destination("LED")):
+            assert flights[0].departure_airport.name == "Шереметьево"
+            assert flights[0].arrival_airport.city == "Санкт-Петербург"
+
     def test_get_flights_by_destination(self, repo):
-        repo.add_airport("SVO", "Шереметьево", "Москва")
-        repo.add_airport("LED", "Пулково", "Санкт-Петербург")
-        repo.add_airport("DME", "Домодедово", "Москва")
-        flights_data = [
-            ("SU100", "SVO", "LED", "2024-05-20 10:00", "2024-05-20 11:30"),
-            ("SU200", "LED", "DME", "2024-05-20 14:00", "2024-05-20 15:30"),
-            ("SU300", "SVO", "DME", "2024-05-20 16:00", "2024-05-20 16:45"),
-        ]
-        for number, departure, arrival, dep_time, arr_time in flights_data:
-            repo.add_flight(number, departure, arrival, dep_time, arr_time)
-        moscow_flights = repo.get_flights_by_destination("DME")
+        repo.add_airports(AIRPORT_ROWS)
+        repo.add_flights(FLIGHT_ROWS)
+        moscow_flights = repo.get_flights_by_destination_core("DME")
         assert len(moscow_flights) == 2
         flight_numbers = {f.number for f in moscow_flights}
         assert flight_numbers == {"SU200", "SU300"}
-        spb_flights = repo.get_flights_by_destination("LED")
+        spb_flights = repo.get_flights_by_destination_core("LED")
         assert len(spb_flights) == 1
         assert spb_flights[0].number == "SU100"
-        empty_flights = repo.get_flights_by_destination("XXX")
+        empty_flights = repo.get_flights_by_destination_core("XXX")
         assert len(empty_flights) == 0
 
+    def test_add_empty_batches(self, repo):
+        repo.add_airports([])
+        repo.add_flights([])
+        assert repo.count_airports() == 0
+        assert repo.count_flights() == 0
+
+    def test_add_flights_is_atomic(self, repo):
+        repo.add_airports(
+            [("SVO", "Шереметьево", "Москва"), ("LED", "Пулково", "Санкт-Петербург")]
+        )
+        with pytest.raises(IntegrityError):
+            repo.add_flights([FLIGHT_ROWS[0], FLIGHT_ROWS[0]])
+        assert repo.get_all_flights_core() == []
+
     def test_empty_repository(self, repo):
-        airports = repo.get_all_airports()
-        flights = repo.get_all_flights()
-        assert len(airports) == 0
-        assert len(flights) == 0
+        assert repo.count_airports() == 0
+        assert repo.count_flights() == 0
 
     def test_duplicate_airport(self, repo):
         repo.add_airport("SVO", "Шереметьево", "Москва")
-        try:
+        with pytest.raises(DuplicateAirportError):
             repo.add_airport("SVO", "Другое название", "Другой город")
-            pytest.fail("Expected exception for duplicate airport")
-        except Exception:
-            pass
+        with pytest.raises(DuplicateAirportError):
+            repo.add_airports(AIRPORT_ROWS)
+        with pytest.raises(DuplicateAirportError):
+            repo.add_airports(
+                [("LED", "Пулково", "Санкт-Петербург"), ("LED", "Другое", "Другой")]
+            )
+        assert len(repo.get_all_airports_core()) == 1
 
     def test_invalid_time_format(self, repo):
         repo.add_airport("SVO", "Шереметьево", "Москва")
         repo.add_airport("LED", "Пулково", "Санкт-Петербург")
-        try:
+        with pytest.raises(ValueError):
             repo.add_flight(
                 "SU100", "SVO", "LED", "неправильный-формат", "2024-05-20 11:30"
             )
-            pytest.fail("Expected ValueError for invalid time format")
-        except ValueError:
-            pass
 
     def test_airport_model(self):
         airport = Airport(code="TEST", name="Тест", city="Город")
@@ -180,13 +270,79 @@ class TestFlightRepositorySQLAlchemy:
         assert flight.arrival_time == arr_time
 
 
+class TestParseDatetime:
+    def test_padded(self):
+        assert parse_datetime("2024-05-20 10:05") == datetime(2024, 5, 20, 10, 5)
+
+    def test_unpadded(self):
+        assert parse_datetime("2024-5-20 9:00") == datetime(2024, 5, 20, 9, 0)
+        assert parse_datetime("2024-05-20 10:5") == datetime(2024, 5, 20, 10, 5)
+
+    @pytest.mark.parametrize(
+        "value",
+        ["2024/05/20 10:05", "2024-05-20T10:05", "2024-02-30 10:05", "", "сегодня"],
+    )
+    def test_invalid(self, value):
+        with pytest.raises(ValueError):
+            parse_datetime(value)
+
+
+class TestCommandLine:
+    @pytest.mark.parametrize(
+        "argv",
+        [
+            [
+                "add-airport",
+                "--code",
+                "SVO",
+                "--name",
+                "Шереметьево",
+                "--city",
+                "Москва",
+            ],
+            [
+                "--db",
+                "other.db",
+                "add-flight",
+                "--arrival-time",
+                "2024-05-20 11:30",
+                "--number",
+                "SU100",
+                "--departure",
+                "SVO",
+                "--arrival",
+                "LED",
+                "--departure-time",
+                "2024-05-20 10:00",
+            ],
+            ["show-flights"],
+            ["select-by-destination", "--airport", "LED"],
+        ],
+    )
+    def test_parse_fast_matches_argparse(self, argv):
+        assert parse_fast(argv) == build_parser().parse_args(argv)
+
+    @pytest.mark.parametrize(
+        "argv",
+        [
+            [],
+            ["--help"],
+            ["show-flights", "--help"],
+            ["add-airport", "--code", "SVO"],
+            ["select-by-destination", "--airport", "LED", "--airport", "DME"],
+        ],
+    )
+    def test_parse_fast_falls_back(self, argv):
+        assert parse_fast(argv) is None
+
+
 class TestDisplayFunctionsSQLAlchemy:
-    def test_display_flights_empty(self, capsys):
-        display_flights([])
-        captured = capsys.readouterr()
-        assert "Список рейсов пуст." in captured.out
+    def test_display_flights_empty(self):
+        output = StringIO()
+        display_flights([], file=output)
+        assert "Список рейсов пуст." in output.getvalue()
 
-    def test_display_flights_with_data(self, capsys):
+    def test_display_flights_with_data(self):
         from datetime import datetime
 
         dep_time = datetime(2024, 5, 20, 10, 0)
@@ -200,18 +356,18 @@ class TestDisplayFunctionsSQLAlchemy:
                 arrival_time=arr_time,
             )
         ]
-        display_flights(flights)
-        captured = capsys.readouterr()
-        assert "SU100" in captured.out
-        assert "SVO" in captured.out
-        assert "LED" in captured.out
-        assert "2024-05-20 10:00" in captured.out
-        assert "2024-05-20 11:30" in captured.out
+        output = StringIO()
+        display_flights(flights, file=output)
+        assert "SU100" in output.getvalue()
+        assert "SVO" in output.getvalue()
+        assert "LED" in output.getvalue()
+        assert "2024-05-20 10:00" in output.getvalue()
+        assert "2024-05-20 11:30" in output.getvalue()
 
-    def test_display_airports_empty(self, capsys):
-        display_airports([])
-        captured = capsys.readouterr()
-        assert "Список аэропортов пуст." in captured.out
+    def test_display_airports_empty(self):
+        output = StringIO()
+        display_airports([], file=output)
+        assert "Список аэропортов пуст." in output.getvalue()
 
     def test_display_airports_with_data(self, capsys):
         airports = [Airport(code="SVO", name="Шереметьево", city="Москва")]
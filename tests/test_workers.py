@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+from datetime import date
+from pathlib import Path
+
+import pytest
+from workers import StaffRepository, Worker
+
+
+class TestStaffRepository:
+    @pytest.fixture
+    def repo(self):
+        with StaffRepository(Path(":memory:")) as repo:
+            yield repo
+
+    def test_add_workers(self, repo):
+        repo.add_workers(
+            [
+                ("Иванов И.И.", "Инженер", 2010),
+                ("Петров П.П.", "Бухгалтер", 2015),
+                ("Сидоров С.С.", "Инженер", 2020),
+            ]
+        )
+        assert list(repo.get_all_workers()) == [
+            Worker("Иванов И.И.", "Инженер", 2010),
+            Worker("Петров П.П.", "Бухгалтер", 2015),
+            Worker("Сидоров С.С.", "Инженер", 2020),
+        ]
+
+    def test_workers_cache_invalidated_on_add(self, repo):
+        repo.add_worker("Иванов И.И.", "Инженер", 2010)
+        assert len(list(repo.get_all_workers())) == 1
+        repo.add_worker("Петров П.П.", "Бухгалтер", 2015)
+        assert len(list(repo.get_all_workers())) == 2
+
+    def test_get_or_create_post_is_idempotent(self, repo):
+        post_id = repo.get_or_create_post("Инженер")
+        assert repo.get_or_create_post("Инженер") == post_id
+
+        # Без кэша должность ищется через UPSERT и получает тот же id.
+        repo._post_cache.clear()
+        assert repo.get_or_create_post("Инженер") == post_id
+        count = repo._conn.execute("SELECT COUNT(*) FROM posts").fetchone()[0]
+        assert count == 1
+
+    def test_posts_reloaded_after_external_add(self, tmp_path):
+        db_path = tmp_path / "workers.db"
+        with StaffRepository(db_path) as reader, StaffRepository(db_path) as writer:
+            reader.add_worker("Иванов И.И.", "Инженер", 2010)
+            writer.add_worker("Петров П.П.", "Бухгалтер", 2015)
+            assert list(reader.select_by_period(0)) == [
+                Worker("Иванов И.И.", "Инженер", 2010),
+                Worker("Петров П.П.", "Бухгалтер", 2015),
+            ]
+
+    def test_worker_without_post_is_skipped(self, repo):
+        repo.add_worker("Иванов И.И.", "Инженер", 2010)
+        with repo._conn:
+            repo._conn.execute(
+                "INSERT INTO workers (worker_name, post_id, worker_year) "
+                "VALUES ('Петров П.П.', 999, 2015)"
+            )
+        assert list(repo.get_all_workers()) == [Worker("Иванов И.И.", "Инженер", 2010)]
+        assert repo.select_by_period(0) == [Worker("Иванов И.И.", "Инженер", 2010)]
+
+    def test_select_by_period(self, repo):
+        year = date.today().year
+        repo.add_workers(
+            [
+                ("Иванов И.И.", "Инженер", year - 10),
+                ("Петров П.П.", "Бухгалтер", year - 5),
+                ("Сидоров С.С.", "Инженер", year - 1),
+            ]
+        )
+        assert [worker.name for worker in repo.select_by_period(5)] == [
+            "Иванов И.И.",
+            "Петров П.П.",
+        ]
+        assert repo.select_by_period(20) == []